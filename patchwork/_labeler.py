@@ -6,7 +6,7 @@
 GUI code for training a model
 
 """
-#import numpy as np
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle
 import panel as pn
@@ -204,6 +204,20 @@ def _generate_label_summary(df, classes):
 
 
 
+def _top_indices(values, M):
+    """
+    Return the positions of the M largest values, in descending 
+    order. Uses a partial sort so we don't have to sort the whole array.
+    
+    :values: array of values to sort by
+    :M: number of positions to retrieve
+    """
+    if M <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(values, -M)[-M:]
+    return top[np.argsort(values[top])[::-1]]
+
+
 def pick_indices(df, pred_df, M, sort_by, subset_by):
     """
     Function to handle selecting indices of images to label
@@ -228,13 +242,13 @@ def pick_indices(df, pred_df, M, sort_by, subset_by):
         sample = df.sample(M)
     # UNCERTAINTY SAMPLING
     elif sort_by == "max entropy":
-        pred_df["entropy"] = shannon_entropy(pred_df.values)
-        sample = pred_df["entropy"].nlargest(M)
+        entropy = shannon_entropy(pred_df.values)
+        sample = pred_df.iloc[_top_indices(entropy, M)]
     # SINGLE-CLASS UNCERTAINTY SAMPLING
     elif "maxent:" in sort_by:
         col = sort_by.replace("maxent:","").strip()
-        pred_df["entropy"] = shannon_entropy(pred_df[[col]].values)
-        sample = pred_df["entropy"].nlargest(M)
+        entropy = shannon_entropy(pred_df[[col]].values)
+        sample = pred_df.iloc[_top_indices(entropy, M)]
     elif "high:" in sort_by:
         col = sort_by.replace("high: ", "")
         sample = pred_df[col].nlargest(M)
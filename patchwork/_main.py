@@ -3,6 +3,7 @@ import pandas as pd
 import panel as pn
 import tensorflow as tf
 import os
+import warnings
 
 from patchwork._labeler import Labeler
 from patchwork._modelpicker import ModelPicker
@@ -20,7 +21,8 @@ class GUI(object):
     
     def __init__(self, df, feature_vecs=None, feature_extractor=None, classes=[],
                  imshape=(256,256), num_channels=3, norm=255,
-                 num_parallel_calls=2, logdir=None, aug=True, dim=3):
+                 num_parallel_calls=2, logdir=None, aug=True, dim=3,
+                 feature_dtype=tf.float32, tiff_dir=None):
         """
         Initialize either with a set of feature vectors or a feature extractor
         
@@ -37,12 +39,30 @@ class GUI(object):
         :aug: Boolean or dict of augmentation parameters. Only matters if you're
             using a feature extractor instead of static features.
         :dim: grid dimension for labeler- show a (dim x dim) square of images
+        :feature_dtype: dtype to store pre-extracted features in. they're cast
+            to float32 a batch at a time during training and inference. pass
+            tf.float16 to halve memory use; note that float16 is lossy and can 
+            only represent magnitudes up to 65504- larger feature values will
+            overflow to inf.
+        :tiff_dir: optional directory of TIFF files decoded with 
+            patchwork.loaders.prebake_tiffs(). Only matters if you're using
+            a feature extractor instead of static features.
         """
         self.fine_tuning_model = None
         # by default, pandas maps empty values to np.nan. in case the user
         # is passing saved labels in, replace those with None
         self.df = df.replace({pd.np.nan: None})
-        self.feature_vecs = feature_vecs
+        # keep a single copy of the features as a tensor so we don't have
+        # to copy them every time we build a training dataset. only hang on
+        # to the shape of the original array so we don't keep a second copy 
+        # around as well.
+        self._use_features = feature_vecs is not None
+        if self._use_features:
+            if (tf.as_dtype(feature_dtype) == tf.float16) and \
+                    (np.abs(feature_vecs).max() > np.finfo(np.float16).max):
+                warnings.warn("feature values are too large for float16 and will overflow to inf")
+            self._feature_shape = feature_vecs.shape
+            self._features_tf = tf.constant(feature_vecs, dtype=feature_dtype)
         self.feature_extractor = feature_extractor
         self._aug = aug
 
@@ -51,6 +71,7 @@ class GUI(object):
         self._norm = norm
         self._num_channels = num_channels
         self._num_parallel_calls = num_parallel_calls
+        self._tiff_dir = tiff_dir
         self._semi_supervised = False
         self._logdir = logdir
         self.models = {"feature_extractor":feature_extractor}
@@ -74,8 +95,8 @@ class GUI(object):
         self.labeler = Labeler(self.classes, self.df, self.pred_df, self._load_img,
                                dim=dim, logdir=logdir)
         # initialize model picker
-        if self.feature_vecs is not None:
-            inpt_channels = self.feature_vecs.shape[-1]
+        if self._use_features:
+            inpt_channels = self._feature_shape[-1]
         else:
             inpt_channels = self.feature_extractor.output.get_shape().as_list()[-1]
 
@@ -88,11 +109,22 @@ class GUI(object):
         
         
         
+    @property
+    def feature_vecs(self):
+        """
+        Pre-extracted features (as a numpy array in feature_dtype), or None
+        if using a feature extractor. Read-only; returns a copy.
+        """
+        if self._use_features:
+            return self._features_tf.numpy()
+        return None
+        
+        
     def _update_unlabeled(self):
         """
         update our array keeping track of unlabeled images
         """
-        self.unlabeled_indices = np.arange(self.N)[np.isnan(self.labels)]
+        self.unlabeled_indices = np.flatnonzero(np.isnan(self.labels))
       
         
     def panel(self):
@@ -105,7 +137,8 @@ class GUI(object):
                        )
         
     
-    def _training_dataset(self, batch_size=32, num_samples=None):
+    def _training_dataset(self, batch_size=32, num_samples=None,
+                          drop_remainder=False):
         """
         Build a single-epoch training set.
         
@@ -114,18 +147,22 @@ class GUI(object):
             
         Semi-supervised case: returns tf.data.Dataset object
             with structure ((x,y), x_unlab)
+            
+        :drop_remainder: if True, drop the last partial batch so that every
+            batch has the same shape
         """
         if num_samples is None:
             num_samples = len(self.df)
         # LIVE FEATURE EXTRACTOR CASE
-        if self.feature_vecs is None:
+        if not self._use_features:
             files, ys = stratified_sample(self.df, num_samples)
             # (x,y) dataset
             ds = dataset(files, ys, imshape=self._imshape, 
                        num_channels=self._num_channels,
                        num_parallel_calls=self._num_parallel_calls, 
                        batch_size=batch_size,
-                       augment=self._aug)[0]
+                       augment=self._aug, tiff_dir=self._tiff_dir,
+                       drop_remainder=drop_remainder)[0]
             
             # include unlabeled data as well if 
             # we're doing semisupervised learning
@@ -140,7 +177,8 @@ class GUI(object):
                        num_channels=self._num_channels,
                        num_parallel_calls=self._num_parallel_calls, 
                        batch_size=batch_size,
-                       augment=self._aug)[0]
+                       augment=self._aug, tiff_dir=self._tiff_dir,
+                       drop_remainder=drop_remainder)[0]
                 ds = tf.data.Dataset.zip((ds, unlab_ds))
             return ds
 
@@ -148,30 +186,32 @@ class GUI(object):
         else:
             inds, ys = stratified_sample(self.df, num_samples, return_indices=True)
             if self._semi_supervised:
-                unlabeled_indices = np.arange(len(self.df))[find_unlabeled(self.df)]
+                unlabeled_indices = np.flatnonzero(find_unlabeled(self.df))
             else:
                 unlabeled_indices = None
                 
-            return _build_in_memory_dataset(self.feature_vecs, 
+            return _build_in_memory_dataset(self._features_tf, 
                                           inds, ys, batch_size=batch_size,
-                                          unlabeled_indices=unlabeled_indices)
+                                          unlabeled_indices=unlabeled_indices,
+                                          drop_remainder=drop_remainder)
 
     def _pred_dataset(self, batch_size=32):
         """
         Build a dataset for predictions
         """
         num_steps = int(np.ceil(len(self.df)/batch_size))
-        if self.feature_vecs is None:
+        if not self._use_features:
             files = self.df["filepath"].values
             return dataset(files, imshape=self._imshape, 
                        num_channels=self._num_channels,
                        num_parallel_calls=self._num_parallel_calls, 
                        batch_size=batch_size, shuffle=False,
-                       augment=False)#, num_steps
+                       augment=False, tiff_dir=self._tiff_dir)#, num_steps
         # PRE-EXTRACTED FEATURE CASE
         else:
-            return tf.data.Dataset.from_tensor_slices(self.feature_vecs
-                                                      ).batch(batch_size), num_steps
+            ds = tf.data.Dataset.from_tensor_slices(self._features_tf
+                                                      ).batch(batch_size)
+            return ds.map(lambda x: tf.cast(x, tf.float32)), num_steps
     
     
     def build_model(self, entropy_reg=0):
@@ -184,8 +224,8 @@ class GUI(object):
         opt = tf.keras.optimizers.RMSprop(1e-3)
 
         # JUST A FINE-TUNING NETWORK
-        if self.feature_vecs is not None:
-            inpt_shape = self.feature_vecs.shape[1:]
+        if self._use_features:
+            inpt_shape = self._feature_shape[1:]
             inpt = tf.keras.layers.Input(inpt_shape)
             output = self.fine_tuning_model(inpt)
             self.model = tf.keras.Model(inpt, output)
@@ -241,21 +281,37 @@ class GUI(object):
     
     def fit(self, batch_size=32, num_samples=None):
         """
-        Run one training epoch
+        Run one training epoch using the keras API. Supervised case only- 
+        use _run_one_training_epoch() for semi-supervised learning.
+        
+        NOTE this uses the compiled model in self._training_model, so it
+        requires build_model() to have been called first. Models built 
+        through the ModelPicker interface should be trained with the
+        TrainManager instead.
+        
+        :batch_size: number of samples per batch
+        :num_samples: number of samples to draw for the epoch; defaults to
+            the length of the dataframe
         """
-        if self.feature_vecs is not None:
-            x, y = self._training_dataset(batch_size, num_samples)
-            return self._training_model.fit(x, y, batch_size=batch_size)
-        else:
-            dataset, num_steps = self._training_dataset(batch_size, num_samples)
-            return self._training_model.fit(dataset, steps_per_epoch=num_steps, epochs=1)
+        assert hasattr(self, "_training_model"), "fit() requires a compiled model; call build_model() first"
+        assert not self._semi_supervised, "fit() doesn't support semi-supervised learning; use _run_one_training_epoch()"
+        if num_samples is None:
+            num_samples = len(self.df)
+        # fit on a batched, prefetched tf.data.Dataset so keras doesn't need 
+        # to wrap numpy arrays in a new one every call. drop the last partial
+        # batch so that every batch has the same shape and the train step 
+        # isn't retraced- unless that would leave us with no batches at all.
+        ds = self._training_dataset(batch_size, num_samples, 
+                                    drop_remainder=num_samples >= batch_size)
+        return self._training_model.fit(ds, epochs=1)
     
     def predict_on_all(self, batch_size=32):
         """
         Run inference on all the data; save to self.pred_df
         """
         ds, num_steps = self._pred_dataset(batch_size)
-        predictions = self.models["full"].predict(ds, steps=num_steps)
+        predictions = np.concatenate([self._predict_function(x).numpy() 
+                                      for x in ds], 0)
 
         self.pred_df.loc[:, self.classes] = predictions
     
@@ -152,6 +152,11 @@ class ModelPicker(object):
         net = fine_tuning_model(net)
         net = output_model(net)
         self._pw.models["full"] = tf.keras.Model(inpt, net)
+        # wrap inference in a tf.function so predict_on_all() doesn't
+        # have to set up a full predict loop every time
+        full_model = self._pw.models["full"]
+        self._pw._predict_function = tf.function(
+                                lambda x: full_model(x, training=False))
         
         # if using mean-teacher- build teacher models
         if self._mean_teacher_alpha.value > 0:
@@ -6,32 +6,62 @@ import tensorflow as tf
 PROTECTED_COLUMN_NAMES = ["filepath", "exclude", "viewpath", "validation"]
 
 
+def _label_cols(df):
+    """
+    Return a list of the label columns of a dataframe
+    """
+    return [x for x in df.columns if x not in PROTECTED_COLUMN_NAMES]
+
+
+def _label_matrix(df):
+    """
+    Return a float array of the label columns of a dataframe, with
+    missing labels as NaN
+    """
+    return df[_label_cols(df)].values.astype(np.float32)
+
+
 def find_unlabeled(df):
     """
-    Return boolean series of totally unlabeled data points
+    Return boolean array of totally unlabeled data points
     """
-    label_types = [x for x in df.columns if 
-                   x not in PROTECTED_COLUMN_NAMES]
-    return pd.isnull(df[label_types]).values.prod(axis=1).astype(bool)
+    return np.isnan(_label_matrix(df)).all(axis=1)
 
 def find_fully_labeled(df):
     """
-    Return boolean series of totally labeled data points
+    Return boolean array of totally labeled data points
     """
-    label_types = [x for x in df.columns if 
-                   x not in PROTECTED_COLUMN_NAMES]
-    return pd.notnull(df[label_types]).values.prod(axis=1).astype(bool)
+    return ~np.isnan(_label_matrix(df)).any(axis=1)
 
 def find_partially_labeled(df):
     """
-    Return boolean series of partially labeled data points
+    Return boolean array of partially labeled data points
     """
-    return (~find_unlabeled(df))&(~find_fully_labeled(df))
+    nan_mask = np.isnan(_label_matrix(df))
+    return nan_mask.any(axis=1)&(~nan_mask.all(axis=1))
+
+
+# subsets that don't depend on a class
+_SUBSET_FUNCTIONS = {
+        "unlabeled":find_unlabeled,
+        "fully labeled":find_fully_labeled,
+        "partially labeled":find_partially_labeled,
+        "excluded":lambda df: (df["exclude"] == True).values,
+        "not excluded":lambda df: (df["exclude"] == False).values,
+        "validation":lambda df: (df["validation"] == True).values
+        }
+
+# subsets of the form "operation: class"
+_CLASS_SUBSET_FUNCTIONS = {
+        "unlabeled":lambda df, c: pd.isnull(df[c]).values,
+        "contains":lambda df, c: (df[c] == 1).values,
+        "doesn't contain":lambda df, c: (df[c] == 0).values
+        }
 
 
 def find_subset(df, s):
     """
-    Macro to return a Boolean Series defining a subset of a dataframe
+    Macro to return a Boolean array defining a subset of a dataframe
     
     :df: the dataframe
     :s: string; how to subset it. values could be:
@@ -40,33 +70,18 @@ def find_subset(df, s):
         -partially labeled
         -excluded
         -not excluded
-        -unlabeled X (for class X)
-        -contains X (for class X)
-        -doesn't contain X (for class X)
-    """
-    if s == "unlabeled":
-        return find_unlabeled(df)
-    elif s == "fully labeled":
-        return find_fully_labeled(df)
-    elif s == "partially labeled":
-        return find_partially_labeled(df)
-    elif s == "excluded":
-        return df["exclude"] == True
-    elif s == "not excluded":
-        return df["exclude"] == False
-    elif "unlabeled:" in s:
-        s = s.replace("unlabeled:", "").strip()
-        return pd.isnull(df[s])
-    elif "contains" in s:
-        s = s.replace("contains:", "").strip()
-        return df[s] == 1
-    elif "doesn't contain" in s:
-        s = s.replace("doesn't contain:", "").strip()
-        return df[s] == 0
-    elif s == "validation":
-        return df["validation"] == True
-    else:
-        assert False, "sorry can't help you"
+        -validation
+        -unlabeled: X (for class X)
+        -contains: X (for class X)
+        -doesn't contain: X (for class X)
+    """
+    if s in _SUBSET_FUNCTIONS:
+        return _SUBSET_FUNCTIONS[s](df)
+    op, _, c = s.partition(":")
+    op = op.strip()
+    if op in _CLASS_SUBSET_FUNCTIONS:
+        return _CLASS_SUBSET_FUNCTIONS[op](df, c.strip())
+    assert False, "sorry can't help you"
 
 
 
@@ -84,46 +99,50 @@ def stratified_sample(df, N=1000, return_indices=False):
     (filepaths or indices), label vectors
     """
     index = df.index.values
-    not_excluded = (df["exclude"] == False)&(df["validation"] == False)
+    not_excluded = ((df["exclude"] == False)&(df["validation"] == False)).values
     filepaths = df["filepath"].values
-    label_types = [x for x in df.columns if x not in PROTECTED_COLUMN_NAMES]
+    # label matrix as small ints, with missing labels mapped to -1
+    L = _label_matrix(df)
+    L = np.where(np.isnan(L), -1, L).astype(np.int8)
     
     # build a hierarchical set of lists for sampling:
     # outer list has two elements: negative and positive labels
     # each of those lists has one list per class, so long as that class has
     # the right type of labels
-    # each element of those is an array of indices meeting the class/label criteria
-    file_lists = [[
-            index[(df[l] == 0)&not_excluded] \
-            for l in label_types if (df[l][not_excluded] == 0).sum() > 0
-            ],
-            [
-            index[(df[l] == 1)&not_excluded] \
-            for l in label_types if (df[l][not_excluded] == 1).sum() > 0
-            ]]
+    # each element of those is an array of row positions meeting the 
+    # class/label criteria
+    file_lists = []
+    for z in [0,1]:
+        mask = (L == z)&not_excluded[:,None]
+        file_lists.append([np.flatnonzero(mask[:,k]) for k in range(L.shape[1])
+                           if mask[:,k].any()])
     num_lists = [len(file_lists[0]), len(file_lists[1])]
     
-    outlist = []
-    ys = []
-    inds = []
-    for n in range(N):
-        # choose to sample a positive or negative label
-        z = np.random.choice([0,1])
+    # choose to sample a positive or negative label for every sample
+    zs = np.random.randint(0, 2, size=N)
+    inds = np.zeros(N, dtype=np.int64)
+    for z in [0,1]:
+        zmask = zs == z
+        count = zmask.sum()
+        if count == 0:
+            continue
         # choose a category with positive/negative
-        i = np.random.choice(np.arange(num_lists[z]))
-        # choose an index consistent with i and z
-        ind = np.random.choice(file_lists[z][i])
-        inds.append(ind)
-        outlist.append(filepaths[ind])
-        # convert labels to a vector with None mapped to -1
-        y_vector = df[label_types].loc[ind].values.astype(float)
-        y_vector[np.isnan(y_vector)] = -1
-        ys.append(y_vector.astype(int))
+        cats = np.random.randint(0, num_lists[z], size=count)
+        # choose an index consistent with i and z. loop over
+        # categories instead of samples
+        z_inds = np.zeros(count, dtype=np.int64)
+        for i in range(num_lists[z]):
+            imask = cats == i
+            z_inds[imask] = np.random.choice(file_lists[z][i], 
+                                             size=imask.sum())
+        inds[zmask] = z_inds
+    # gather label vectors (with None already mapped to -1)
+    ys = L[inds].astype(np.int64)
         
     if return_indices:
-        return np.array(inds), np.stack(ys)
+        return index[inds], ys
     else:
-        return outlist, np.stack(ys)
+        return filepaths[inds], ys
 
 
 def unlabeled_sample(df, N=1000):
@@ -136,23 +155,42 @@ def unlabeled_sample(df, N=1000):
     unlabeled = df["filepath"][find_unlabeled(df)].values
     return np.random.choice(unlabeled, size=N, replace=True)
     
-def _build_in_memory_dataset(features, indices, labels, batch_size=16, unlabeled_indices=None):
+def _gather(features, indices):
+    """
+    Gather a batch of features and cast to float32
+    """
+    return tf.cast(tf.gather(features, indices), tf.float32)
+
+
+def _build_in_memory_dataset(features, indices, labels, batch_size=16, unlabeled_indices=None,
+                             drop_remainder=False):
     """
     Build tf.data.Dataset object for training in the pre-extracted feature case.
     
-    :features: rank-4 tensor of pre-extracted features
+    :features: rank-4 tensor of pre-extracted features. pass a tf.Tensor
+        to avoid copying the features every time a dataset is built; 
+        batches are cast to float32
     :indices: indices of features generated by stratified sampler
     :labels: label vectors corresponding to indices
     :unlabeled_indices: indices of unlabeled features for semi-supervised learning
+    :drop_remainder: if True, drop the last partial batch so that every batch
+        has the same shape
     """
-    x = features[indices].astype(np.float32)
+    if not isinstance(features, tf.Tensor):
+        features = tf.constant(features, dtype=tf.float32)
+    # build the dataset out of indices, and gather the features inside
+    # the pipeline so that we don't have to copy them out first
     if unlabeled_indices is not None:
         unlabeled_samp_indices = np.random.choice(unlabeled_indices, replace=True, size=len(indices))
-
-        x_unlab = features[unlabeled_samp_indices].astype(np.float32)
-        ds = tf.data.Dataset.from_tensor_slices(((x,labels), x_unlab))
+        ds = tf.data.Dataset.from_tensor_slices(((indices,labels), unlabeled_samp_indices))
+        ds = ds.batch(batch_size, drop_remainder=drop_remainder)
+        ds = ds.map(lambda x, u: ((_gather(features, x[0]), x[1]), 
+                                  _gather(features, u)),
+                    num_parallel_calls=tf.data.experimental.AUTOTUNE)
     else:
-        ds = tf.data.Dataset.from_tensor_slices((x, labels))
-    ds = ds.batch(batch_size)
-    ds = ds.prefetch(1)
-    return ds
\ No newline at end of file
+        ds = tf.data.Dataset.from_tensor_slices((indices, labels))
+        ds = ds.batch(batch_size, drop_remainder=drop_remainder)
+        ds = ds.map(lambda i, y: (_gather(features, i), y),
+                    num_parallel_calls=tf.data.experimental.AUTOTUNE)
+    ds = ds.prefetch(tf.data.experimental.AUTOTUNE)
+    return ds
@@ -6,7 +6,7 @@ def shannon_entropy(x):
     """
     Shannon entropy of a 2D array
     """
-    xprime = np.maximum(np.minimum(x, 1-1e-8), 1e-8)
+    xprime = np.clip(x, 1e-8, 1-1e-8)
     return -np.sum(xprime*np.log2(xprime), axis=1)
 
 
@@ -72,8 +72,8 @@ class AutoEncoderTrainer(GenericExtractor):
                  augment=True, 
                  lr=1e-3, lr_decay=100000,
                  imshape=(256,256), num_channels=3,
-                 norm=255, batch_size=64, num_parallel_calls=None,
-                 single_channel=False, notes="",
+                 norm=255, batch_size=64, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                 single_channel=False, tiff_dir=None, notes="",
                  downstream_labels=None):
         """
         :logdir: (string) path to log directory
@@ -90,9 +90,12 @@ class AutoEncoderTrainer(GenericExtractor):
         :norm: (int or float) normalization constant for images (for rescaling to
                unit interval)
         :batch_size: (int) batch size for training
-        :num_parallel_calls: (int) number of threads for loader mapping
+        :num_parallel_calls: (int) number of threads for loader mapping. defaults
+            to letting tf.data autotune it
         :single_channel: if True, expect a single-channel input image and 
                 stack it num_channels times.
+        :tiff_dir: optional directory of TIFF files decoded with 
+                patchwork.loaders.prebake_tiffs()
         :notes: (string) any notes on the experiment that you want saved in the
                 config.yml file
         :downstream_labels: dictionary mapping image file paths to labels
@@ -124,14 +127,16 @@ class AutoEncoderTrainer(GenericExtractor):
         self._train_ds, _ = dataset(trainingdata, imshape=imshape,norm=norm,
                                     sobel=False, num_channels=num_channels,
                                     augment=augment, single_channel=single_channel,
-                                    batch_size=batch_size, shuffle=True)
+                                    batch_size=batch_size, shuffle=True,
+                                    tiff_dir=tiff_dir)
         # build evaluation dataset
         if testdata is not None:
             self._test_ds, self._test_steps = dataset(testdata,
                                      imshape=imshape,norm=norm,
                                      sobel=False, num_channels=num_channels,
                                      single_channel=single_channel,
-                                     batch_size=batch_size, shuffle=False)
+                                     batch_size=batch_size, shuffle=False,
+                                     tiff_dir=tiff_dir)
             self._test = True
         else:
             self._test = False
@@ -151,7 +156,8 @@ class AutoEncoderTrainer(GenericExtractor):
                             imshape=imshape, num_channels=num_channels,
                             norm=norm, batch_size=batch_size,
                             num_parallel_calls=num_parallel_calls, 
-                            single_channel=single_channel, notes=notes)
+                            single_channel=single_channel, tiff_dir=tiff_dir,
+                            notes=notes)
         
         
     def _run_training_epoch(self, **kwargs):
@@ -59,7 +59,8 @@ def maskinator(img, mask):
 def _build_context_encoder_dataset(filepaths, input_shape=(256,256,3), norm=255,
                                    shuffle=True, num_parallel_calls=4,
                                    batch_size=32, prefetch=True, augment=False,
-                                   sobel=False, single_channel=False):
+                                   sobel=False, single_channel=False,
+                                   tiff_dir=None):
     """
     Build a tf.data.Dataset object to use for training.
     """
@@ -73,7 +74,8 @@ def _build_context_encoder_dataset(filepaths, input_shape=(256,256,3), norm=255,
     img_ds = _image_file_dataset(filepaths, imshape=input_shape[:2], 
                                  num_channels=input_shape[2], norm=norm,
                                  num_parallel_calls=num_parallel_calls,
-                                 shuffle=True, single_channel=single_channel)
+                                 shuffle=True, single_channel=single_channel,
+                                 tiff_dir=tiff_dir)
 
     if augment:
         _aug = augment_function(input_shape[:2], augment)
@@ -262,8 +264,8 @@ class ContextEncoderTrainer(GenericExtractor):
                  discriminator=None, augment=True, 
                  recon_weight=1, adv_weight=1e-3, lr=1e-4,
                   imshape=(256,256), num_channels=3,
-                 norm=255, batch_size=64, shuffle=True, num_parallel_calls=None,
-                 sobel=False, single_channel=False, notes="",
+                 norm=255, batch_size=64, shuffle=True, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                 sobel=False, single_channel=False, tiff_dir=None, notes="",
                  downstream_labels=None):
         """
         :logdir: (string) path to log directory
@@ -283,10 +285,13 @@ class ContextEncoderTrainer(GenericExtractor):
         :norm: (int or float) normalization constant for images (for rescaling to
                unit interval)
         :batch_size: (int) batch size for training
-        :num_parallel_calls: (int) number of threads for loader mapping
+        :num_parallel_calls: (int) number of threads for loader mapping. defaults
+            to letting tf.data autotune it
         :sobel: whether to replace the input image with its sobel edges
         :single_channel: if True, expect a single-channel input image and 
             stack it num_channels times.
+        :tiff_dir: optional directory of TIFF files decoded with 
+            patchwork.loaders.prebake_tiffs()
         :notes: (string) any notes on the experiment that you want saved in the
                 config.yml file
         :downstream_labels: dictionary mapping image file paths to labels                
@@ -326,7 +331,8 @@ class ContextEncoderTrainer(GenericExtractor):
                                 num_parallel_calls=num_parallel_calls,
                                 batch_size=batch_size, prefetch=True,
                                 augment=augment, sobel=sobel,
-                                single_channel=single_channel)
+                                single_channel=single_channel,
+                                tiff_dir=tiff_dir)
         else:
             assert isinstance(trainingdata, tf.data.Dataset), "i don't know what to do with this"
             self._train_ds = trainingdata
@@ -357,7 +363,8 @@ class ContextEncoderTrainer(GenericExtractor):
                             imshape=imshape, num_channels=num_channels,
                             norm=norm, batch_size=batch_size, 
                             num_parallel_calls=num_parallel_calls, sobel=sobel,
-                            single_channel=single_channel, notes=notes)
+                            single_channel=single_channel, tiff_dir=tiff_dir,
+                            notes=notes)
         
         
     def _run_training_epoch(self, **kwargs):
@@ -44,14 +44,14 @@ def cluster(vecs, pca_dim=256, k=100, init='k-means++', testvecs=None,
     
     # if there are any empty clusters- randomly reassign the centroid
     # to a jittered randomly-chosen non-empty cluster
-    for i in range(k):
-        # empty if no labels assigned
-        if i not in kmeans.labels_:
-            # choose an occupied cluster
-            j = np.random.choice(kmeans.labels_)
-            new_centroid = kmeans.cluster_centers_[j,:] + np.random.normal(0, 0.1,
-                                                  kmeans.cluster_centers_.shape[1])
-            kmeans.cluster_centers_[i,:] = new_centroid
+    # (empty if no labels assigned)
+    empty = np.flatnonzero(~np.isin(np.arange(k), kmeans.labels_))
+    for i in empty:
+        # choose an occupied cluster
+        j = np.random.choice(kmeans.labels_)
+        new_centroid = kmeans.cluster_centers_[j,:] + np.random.normal(0, 0.1,
+                                              kmeans.cluster_centers_.shape[1])
+        kmeans.cluster_centers_[i,:] = new_centroid
         
     
     # if test data was passed- make predictions on that as well
@@ -132,8 +132,8 @@ class DeepClusterTrainer(GenericExtractor):
                  pca_dim=256, k=1000, dense=[4096], mult=1, 
                  kmeans_max_iter=100, kmeans_batch_size=100, lr=0.05, lr_decay=100000,
                   imshape=(256,256), num_channels=3,
-                 norm=255, batch_size=64, num_parallel_calls=None,
-                 sobel=False, single_channel=False, notes="",
+                 norm=255, batch_size=64, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                 sobel=False, single_channel=False, tiff_dir=None, notes="",
                  downstream_labels=None):
         """
         :logdir: (string) path to log directory
@@ -158,10 +158,13 @@ class DeepClusterTrainer(GenericExtractor):
         :norm: (int or float) normalization constant for images (for rescaling to
                unit interval)
         :batch_size: (int) batch size for training
-        :num_parallel_calls: (int) number of threads for loader mapping
+        :num_parallel_calls: (int) number of threads for loader mapping. defaults
+            to letting tf.data autotune it
         :sobel: whether to replace the input image with its sobel edges
         :single_channel: if True, expect a single-channel input image and 
                 stack it num_channels times.
+        :tiff_dir: optional directory of TIFF files decoded with 
+                patchwork.loaders.prebake_tiffs()
         :notes: (string) any notes on the experiment that you want saved in the
                 config.yml file
         :downstream_labels: dictionary mapping image file paths to labels
@@ -202,7 +205,8 @@ class DeepClusterTrainer(GenericExtractor):
             self._test_ds, self._test_steps = dataset(testdata,
                                      imshape=imshape,norm=norm,
                                      sobel=sobel, num_channels=num_channels,
-                                     single_channel=single_channel)
+                                     single_channel=single_channel,
+                                     tiff_dir=tiff_dir)
             self._test = True
         else:
             self._test = False
@@ -212,7 +216,8 @@ class DeepClusterTrainer(GenericExtractor):
         # build prediction dataset for clustering
         ds, num_steps = dataset(trainingdata, imshape=imshape, num_channels=num_channels, 
                  num_parallel_calls=num_parallel_calls, batch_size=batch_size, 
-                 augment=False, sobel=sobel, single_channel=single_channel)
+                 augment=False, sobel=sobel, single_channel=single_channel,
+                 tiff_dir=tiff_dir)
         self._pred_ds = ds
         self._pred_steps = num_steps
         
@@ -237,7 +242,8 @@ class DeepClusterTrainer(GenericExtractor):
                             imshape=imshape, num_channels=num_channels,
                             norm=norm, batch_size=batch_size,
                             num_parallel_calls=num_parallel_calls, sobel=sobel,
-                            single_channel=single_channel, notes=notes)
+                            single_channel=single_channel, tiff_dir=tiff_dir,
+                            notes=notes)
         
         
     def _run_training_epoch(self, **kwargs):
@@ -285,7 +291,8 @@ class DeepClusterTrainer(GenericExtractor):
                                     mult=self.config["mult"],
                                     augment=self.augment_config,
                                     sobel=self.input_config["sobel"],
-                                    single_channel=self.input_config["single_channel"])
+                                    single_channel=self.input_config["single_channel"],
+                                    tiff_dir=self.input_config["tiff_dir"])
         
         for x, y in train_ds:
             loss = self._training_step(x, y, self._models["full"], 
@@ -21,7 +21,8 @@ from patchwork.loaders import dataset
 
 
 INPUT_PARAMS = ["imshape", "num_channels", "norm", "batch_size",
-                "shuffle", "num_parallel_calls", "sobel", "single_channel"]
+                "shuffle", "num_parallel_calls", "sobel", "single_channel",
+                "tiff_dir"]
 
 
 
@@ -84,8 +85,8 @@ class GenericExtractor(object):
     
     def __init__(self, logdir, trainingdata, fcn=None, augment=False, 
                  extractor_param=None, imshape=(256,256), num_channels=3,
-                 norm=255, batch_size=64, shuffle=True, num_parallel_calls=None,
-                 sobel=False, single_channel=False):
+                 norm=255, batch_size=64, shuffle=True, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                 sobel=False, single_channel=False, tiff_dir=None):
         """
         :logdir: (string) path to log directory
         :trainingdata: (list or tf Dataset) list of paths to training images, or
@@ -100,10 +101,13 @@ class GenericExtractor(object):
                unit interval)
         :batch_size: (int) batch size for training
         :shuffle: (bool) whether to shuffle training set
-        :num_parallel_calls: (int) number of threads for loader mapping
+        :num_parallel_calls: (int) number of threads for loader mapping. defaults
+            to letting tf.data autotune it
         :sobel: whether to replace the input image with its sobel edges
         :single_channel: if True, expect a single-channel input image and 
             stack it num_channels times.
+        :tiff_dir: optional directory of TIFF files decoded with 
+            patchwork.loaders.prebake_tiffs()
         """
         self.logdir = logdir
         
@@ -120,7 +124,7 @@ class GenericExtractor(object):
                             imshape=imshape, num_channels=num_channels,
                             norm=norm, batch_size=batch_size, shuffle=shuffle,
                             num_parallel_calls=num_parallel_calls, sobel=sobel,
-                            single_channel=single_channel)
+                            single_channel=single_channel, tiff_dir=tiff_dir)
         
         
         
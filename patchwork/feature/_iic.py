@@ -87,9 +87,9 @@ def iic_training_step(x1, x2, fcn, heads, opt, variables, entropy_weight=0):
 
 
 def build_iic_dataset(imfiles, r=5, imshape=(256,256), batch_size=256, 
-                      num_parallel_calls=None, norm=255,
+                      num_parallel_calls=tf.data.experimental.AUTOTUNE, norm=255,
                       num_channels=3, augment=True,
-                      single_channel=False):
+                      single_channel=False, tiff_dir=None):
     """
     Build a tf.data.Dataset object for training IIC.
     """
@@ -99,7 +99,8 @@ def build_iic_dataset(imfiles, r=5, imshape=(256,256), batch_size=256,
     ds = _image_file_dataset(imfiles, imshape=imshape, 
                              num_parallel_calls=num_parallel_calls,
                              norm=norm, num_channels=num_channels,
-                             shuffle=True, single_channel=single_channel)
+                             shuffle=True, single_channel=single_channel,
+                             tiff_dir=tiff_dir)
     
     if r > 1:
         ds = ds.flat_map(lambda x: tf.data.Dataset.from_tensors(x).repeat(r))
@@ -124,8 +125,8 @@ class InvariantInformationClusteringTrainer(GenericExtractor):
                  augment=True, k=10, h=5, k_oc=25, r=5,
                  entropy_weight=0, lr=1e-4, lr_decay=100000,
                  imshape=(256,256), num_channels=3,
-                 norm=255, batch_size=64, num_parallel_calls=None,
-                 sobel=False, single_channel=False, notes="",
+                 norm=255, batch_size=64, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                 sobel=False, single_channel=False, tiff_dir=None, notes="",
                  downstream_labels=None):
         """
         :logdir: (string) path to log directory
@@ -147,10 +148,13 @@ class InvariantInformationClusteringTrainer(GenericExtractor):
         :norm: (int or float) normalization constant for images (for rescaling to
                unit interval)
         :batch_size: (int) batch size for training
-        :num_parallel_calls: (int) number of threads for loader mapping
+        :num_parallel_calls: (int) number of threads for loader mapping. defaults
+            to letting tf.data autotune it
         :sobel:
         :single_channel: if True, expect a single-channel input image and 
                 stack it num_channels times.
+        :tiff_dir: optional directory of TIFF files decoded with 
+                patchwork.loaders.prebake_tiffs()
         :notes: (string) any notes on the experiment that you want saved in the
                 config.yml file
         :downstream_labels: dictionary mapping image file paths to labels
@@ -165,14 +169,16 @@ class InvariantInformationClusteringTrainer(GenericExtractor):
                                            num_parallel_calls=num_parallel_calls,
                                            norm=norm, num_channels=num_channels,
                                            augment=augment,
-                                           single_channel=single_channel)
+                                           single_channel=single_channel,
+                                           tiff_dir=tiff_dir)
         if testdata is not None:
             self._test_ds = build_iic_dataset(testdata, r=r, imshape=imshape,
                                            batch_size=batch_size, 
                                            num_parallel_calls=num_parallel_calls,
                                            norm=norm, num_channels=num_channels,
                                            augment=augment,
-                                           single_channel=single_channel)
+                                           single_channel=single_channel,
+                                           tiff_dir=tiff_dir)
             self._test = True
         else:
             self._test = False
@@ -219,7 +225,7 @@ class InvariantInformationClusteringTrainer(GenericExtractor):
                             norm=norm, batch_size=batch_size, 
                             num_parallel_calls=num_parallel_calls,
                             augment=augment, sobel=sobel, single_channel=single_channel,
-                            notes=notes)
+                            tiff_dir=tiff_dir, notes=notes)
         
         
     @tf.function
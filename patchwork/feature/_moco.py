@@ -40,9 +40,9 @@ def exponential_model_update(slow, fast, alpha=0.999):
 
 
 def build_augment_pair_dataset(imfiles, imshape=(256,256), batch_size=256, 
-                      num_parallel_calls=None, norm=255,
+                      num_parallel_calls=tf.data.experimental.AUTOTUNE, norm=255,
                       num_channels=3, augment=True,
-                      single_channel=False):
+                      single_channel=False, tiff_dir=None):
     """
     Build a tf.data.Dataset object for training momentum 
     contrast. Generates pairs of augmentations from a single
@@ -54,7 +54,8 @@ def build_augment_pair_dataset(imfiles, imshape=(256,256), batch_size=256,
     ds = _image_file_dataset(imfiles, imshape=imshape, 
                              num_parallel_calls=num_parallel_calls,
                              norm=norm, num_channels=num_channels,
-                             shuffle=True, single_channel=single_channel)  
+                             shuffle=True, single_channel=single_channel,
+                             tiff_dir=tiff_dir)  
     
     a1 = ds.map(_aug, num_parallel_calls=num_parallel_calls)
     a2 = ds.map(_aug, num_parallel_calls=num_parallel_calls)
@@ -130,8 +131,8 @@ class MomentumContrastTrainer(GenericExtractor):
                  tau=0.07, output_dim=128,
                  lr=0.01, lr_decay=100000,
                  imshape=(256,256), num_channels=3,
-                 norm=255, batch_size=64, num_parallel_calls=None,
-                 sobel=False, single_channel=False, notes="",
+                 norm=255, batch_size=64, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                 sobel=False, single_channel=False, tiff_dir=None, notes="",
                  downstream_labels=None):
         """
         :logdir: (string) path to log directory
@@ -150,10 +151,13 @@ class MomentumContrastTrainer(GenericExtractor):
         :norm: (int or float) normalization constant for images (for rescaling to
                unit interval)
         :batch_size: (int) batch size for training
-        :num_parallel_calls: (int) number of threads for loader mapping
+        :num_parallel_calls: (int) number of threads for loader mapping. defaults
+            to letting tf.data autotune it
         :sobel: whether to replace the input image with its sobel edges
         :single_channel: if True, expect a single-channel input image and 
                 stack it num_channels times.
+        :tiff_dir: optional directory of TIFF files decoded with 
+                patchwork.loaders.prebake_tiffs()
         :notes: (string) any notes on the experiment that you want saved in the
                 config.yml file
         :downstream_labels: dictionary mapping image file paths to labels
@@ -189,7 +193,8 @@ class MomentumContrastTrainer(GenericExtractor):
                             imshape=imshape, batch_size=batch_size,
                             num_parallel_calls=num_parallel_calls, 
                             norm=norm, num_channels=channels, 
-                            augment=augment, single_channel=single_channel)
+                            augment=augment, single_channel=single_channel,
+                            tiff_dir=tiff_dir)
         
         # create optimizer
         if lr_decay > 0:
@@ -239,7 +244,8 @@ class MomentumContrastTrainer(GenericExtractor):
                             imshape=imshape, num_channels=num_channels,
                             norm=norm, batch_size=batch_size,
                             num_parallel_calls=num_parallel_calls, sobel=sobel,
-                            single_channel=single_channel, notes=notes)
+                            single_channel=single_channel, tiff_dir=tiff_dir,
+                            notes=notes)
         self._prepopulate_buffer()
         
     def _prepopulate_buffer(self):
@@ -15,7 +15,8 @@ from patchwork._augment import augment_function
 from patchwork._layers import _next_layer
 
 INPUT_PARAMS = ["imshape", "num_channels", "norm", "batch_size",
-                "shuffle", "num_parallel_calls", "sobel", "single_channel"]
+                "shuffle", "num_parallel_calls", "sobel", "single_channel",
+                "tiff_dir"]
 
 def _encode_classes(train, val):
     """
@@ -184,10 +185,11 @@ def _sampling_probabilities(indices):
 
          
 def _mtdataset(filepaths, labels, imshape, num_parallel_calls, norm,
-               num_channels, single_channel, aug, batch_size):
+               num_channels, single_channel, aug, batch_size, tiff_dir=None):
     ds = _image_file_dataset(filepaths, imshape, num_parallel_calls,
                                  norm, num_channels,
-                                 single_channel=single_channel)
+                                 single_channel=single_channel,
+                                 tiff_dir=tiff_dir)
     if aug:
         _aug = augment_function(imshape, aug)
         ds = ds.map(_aug)
@@ -231,8 +233,8 @@ class MultiTaskTrainer(object):
                  train_fcn=False,
                  lr=1e-3, lr_decay=0, balance_probs=True,
                  augment=False, imshape=(256,256), num_channels=3,
-                 norm=255, batch_size=64, shuffle=True, num_parallel_calls=None,
-                 single_channel=False, notes=""):
+                 norm=255, batch_size=64, shuffle=True, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                 single_channel=False, tiff_dir=None, notes=""):
         """
         :logdir: (string) path to log directory
         :trainingdata: pandas dataframe of training data
@@ -261,10 +263,13 @@ class MultiTaskTrainer(object):
                unit interval)
         :batch_size: (int) batch size for training
         :shuffle: (bool) whether to shuffle training set
-        :num_parallel_calls: (int) number of threads for loader mapping
+        :num_parallel_calls: (int) number of threads for loader mapping. defaults
+            to letting tf.data autotune it
         :sobel: whether to replace the input image with its sobel edges
         :single_channel: if True, expect a single-channel input image and 
             stack it num_channels times.
+        :tiff_dir: optional directory of TIFF files decoded with 
+            patchwork.loaders.prebake_tiffs()
         :notes: any experimental notes you want recorded in the config.yml file
         """
         adaptive = task_weights == "adaptive"
@@ -313,7 +318,8 @@ class MultiTaskTrainer(object):
         # build validation dataset. 
         self._val_ds = _mtdataset(self._labels["val_files"], None,
                                   imshape, num_parallel_calls, norm, num_channels,
-                                  single_channel, False, batch_size)
+                                  single_channel, False, batch_size,
+                                  tiff_dir=tiff_dir)
         
         self._file_writer = tf.summary.create_file_writer(logdir, flush_millis=10000)
         self._file_writer.set_as_default()
@@ -327,7 +333,8 @@ class MultiTaskTrainer(object):
                             num_channels=num_channels,
                             norm=norm, batch_size=batch_size, shuffle=shuffle,
                             num_parallel_calls=num_parallel_calls,
-                            single_channel=single_channel, notes=notes)
+                            single_channel=single_channel, tiff_dir=tiff_dir,
+                            notes=notes)
         
         
         
@@ -375,7 +382,8 @@ class MultiTaskTrainer(object):
                             self.input_config["num_channels"],
                             self.input_config["single_channel"],
                             self.augment_config,
-                            self.input_config["batch_size"])
+                            self.input_config["batch_size"],
+                            tiff_dir=self.input_config["tiff_dir"])
             
             for x, *y in ds:
                 loss, task_losses = self._training_step(x,y)
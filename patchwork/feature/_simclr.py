@@ -9,9 +9,9 @@ from patchwork.loaders import _image_file_dataset
 BIG_NUMBER = 1000.
 
 def _build_simclr_dataset(imfiles, imshape=(256,256), batch_size=256, 
-                      num_parallel_calls=None, norm=255,
+                      num_parallel_calls=tf.data.experimental.AUTOTUNE, norm=255,
                       num_channels=3, augment=True,
-                      single_channel=False):
+                      single_channel=False, tiff_dir=None):
     """
     
     """
@@ -21,7 +21,8 @@ def _build_simclr_dataset(imfiles, imshape=(256,256), batch_size=256,
     ds = _image_file_dataset(imfiles, imshape=imshape, 
                              num_parallel_calls=num_parallel_calls,
                              norm=norm, num_channels=num_channels,
-                             shuffle=True, single_channel=single_channel)  
+                             shuffle=True, single_channel=single_channel,
+                             tiff_dir=tiff_dir)  
     @tf.function
     def _augment_and_stack(x):
         y = tf.constant(np.array([1,-1]).astype(np.int32))
@@ -109,8 +110,8 @@ class SimCLRTrainer(GenericExtractor):
                  output_dim=64,
                  lr=0.01, lr_decay=100000,
                  imshape=(256,256), num_channels=3,
-                 norm=255, batch_size=64, num_parallel_calls=None,
-                 single_channel=False, notes="",
+                 norm=255, batch_size=64, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                 single_channel=False, tiff_dir=None, notes="",
                  downstream_labels=None):
         """
         :logdir: (string) path to log directory
@@ -128,9 +129,12 @@ class SimCLRTrainer(GenericExtractor):
         :norm: (int or float) normalization constant for images (for rescaling to
                unit interval)
         :batch_size: (int) batch size for training
-        :num_parallel_calls: (int) number of threads for loader mapping
+        :num_parallel_calls: (int) number of threads for loader mapping. defaults
+            to letting tf.data autotune it
         :single_channel: if True, expect a single-channel input image and 
                 stack it num_channels times.
+        :tiff_dir: optional directory of TIFF files decoded with 
+                patchwork.loaders.prebake_tiffs()
         :notes: (string) any notes on the experiment that you want saved in the
                 config.yml file
         :downstream_labels: dictionary mapping image file paths to labels
@@ -161,7 +165,8 @@ class SimCLRTrainer(GenericExtractor):
                                         num_parallel_calls=num_parallel_calls, 
                                         norm=norm, num_channels=num_channels, 
                                         augment=augment,
-                                        single_channel=single_channel)
+                                        single_channel=single_channel,
+                                        tiff_dir=tiff_dir)
         
         # create optimizer
         if lr_decay > 0:
@@ -185,7 +190,8 @@ class SimCLRTrainer(GenericExtractor):
                                         num_parallel_calls=num_parallel_calls, 
                                         norm=norm, num_channels=num_channels, 
                                         augment=augment,
-                                        single_channel=single_channel)
+                                        single_channel=single_channel,
+                                        tiff_dir=tiff_dir)
             
             @tf.function
             def test_loss(x,y):
@@ -215,7 +221,8 @@ class SimCLRTrainer(GenericExtractor):
                             imshape=imshape, num_channels=num_channels,
                             norm=norm, batch_size=batch_size,
                             num_parallel_calls=num_parallel_calls,
-                            single_channel=single_channel, notes=notes)
+                            single_channel=single_channel, tiff_dir=tiff_dir,
+                            notes=notes)
 
     def _run_training_epoch(self, **kwargs):
         """
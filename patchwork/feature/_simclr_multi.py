@@ -71,8 +71,8 @@ class DistributedSimCLRTrainer(SimCLRTrainer):
                  output_dim=64,
                  lr=0.01, lr_decay=100000,
                  imshape=(256,256), num_channels=3,
-                 norm=255, batch_size=64, num_parallel_calls=None,
-                 single_channel=False, notes="",
+                 norm=255, batch_size=64, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                 single_channel=False, tiff_dir=None, notes="",
                  downstream_labels=None):
         """
         :strategy: a tf.distribute Strategy object.
@@ -91,9 +91,12 @@ class DistributedSimCLRTrainer(SimCLRTrainer):
         :norm: (int or float) normalization constant for images (for rescaling to
                unit interval)
         :batch_size: (int) batch size for training
-        :num_parallel_calls: (int) number of threads for loader mapping
+        :num_parallel_calls: (int) number of threads for loader mapping. defaults
+            to letting tf.data autotune it
         :single_channel: if True, expect a single-channel input image and 
                 stack it num_channels times.
+        :tiff_dir: optional directory of TIFF files decoded with 
+                patchwork.loaders.prebake_tiffs()
         :notes: (string) any notes on the experiment that you want saved in the
                 config.yml file
         :downstream_labels: dictionary mapping image file paths to labels
@@ -128,7 +131,8 @@ class DistributedSimCLRTrainer(SimCLRTrainer):
                                       num_parallel_calls=num_parallel_calls,
                                       norm=norm, num_channels=num_channels,
                                       augment=augment,
-                                      single_channel=single_channel))
+                                      single_channel=single_channel,
+                                      tiff_dir=tiff_dir))
         
         # create optimizer
         if lr_decay > 0:
@@ -155,7 +159,8 @@ class DistributedSimCLRTrainer(SimCLRTrainer):
                                         num_parallel_calls=num_parallel_calls, 
                                         norm=norm, num_channels=num_channels, 
                                         augment=augment,
-                                        single_channel=single_channel)
+                                        single_channel=single_channel,
+                                        tiff_dir=tiff_dir)
             
             @tf.function
             def test_loss(x,y):
@@ -186,7 +191,8 @@ class DistributedSimCLRTrainer(SimCLRTrainer):
                             imshape=imshape, num_channels=num_channels,
                             norm=norm, batch_size=batch_size,
                             num_parallel_calls=num_parallel_calls, 
-                            single_channel=single_channel, notes=notes)
+                            single_channel=single_channel, tiff_dir=tiff_dir,
+                            notes=notes)
 
 """
     def _run_training_epoch(self, **kwargs):
@@ -6,6 +6,10 @@ Code for loading data into tensorflow datasets
 """
 import numpy as np
 import tensorflow as tf
+import os
+import hashlib
+import functools
+import multiprocessing
 #from PIL import Image
 from patchwork._util import tiff_to_array
 
@@ -40,21 +44,79 @@ def _generate_imtypes(fps):
         gif 2
         tif 3
     """
+    fps = np.char.lower(np.asarray(fps).astype(str))
     imtypes = np.zeros(len(fps), dtype=np.int64)
-    for i in range(len(fps)):
-        t = fps[i].lower()
-        if (".jpg" in t) or ("jpeg" in t):
-            imtypes[i] = 1
-        elif ".gif" in t:
-            imtypes[i] = 2
-        elif ".tif" in t:
-            imtypes[i] = 3
+    # assign in reverse order of precedence so jpg wins ties
+    imtypes[np.char.find(fps, ".tif") >= 0] = 3
+    imtypes[np.char.find(fps, ".gif") >= 0] = 2
+    imtypes[(np.char.find(fps, ".jpg") >= 0)|(np.char.find(fps, "jpeg") >= 0)] = 1
     return imtypes
 
+def _prebaked_path(f, tiff_dir, norm=255, num_channels=-1):
+    """
+    Path that prebake_tiffs() stores the decoded version of a TIFF file to.
+    The name is a hash of the file's path, modification time and size, and
+    the decoding parameters- so a decoded file is only reused if it was 
+    made from the current version of the TIFF with the same settings.
+    """
+    stat = os.stat(f)
+    key = "%s|%s|%s|%s|%s"%(os.path.abspath(f), stat.st_mtime, stat.st_size,
+                            norm, num_channels)
+    name = hashlib.md5(key.encode("utf-8")).hexdigest()
+    return os.path.join(tiff_dir, name + ".tensor")
+
+
+def _tiff_to_float16(f, norm=255, num_channels=-1):
+    """
+    Load a TIFF file to a rank-3 float16 array
+    """
+    img_arr = tiff_to_array(f, swapaxes=True, norm=norm, 
+                            num_channels=num_channels)
+    if len(img_arr.shape) == 2:
+        img_arr = img_arr[:,:,np.newaxis]
+    return img_arr.astype(np.float16)
+
+
+def prebake_tiffs(fps, tiff_dir, norm=255, num_channels=3, processes=4):
+    """
+    Decode the TIFF files in a list of filepaths once and save them as 
+    serialized float16 tensors. Datasets built with tiff_dir pointing
+    at the same directory will load these with native tensorflow ops
+    instead of calling GDAL through tf.py_function (which holds the GIL
+    and keeps the loader from scaling with num_parallel_calls).
+    
+    Decoding runs in "spawn" worker processes, since forking after 
+    tensorflow has started its threads can deadlock. This means scripts 
+    calling this function need an if __name__ == "__main__": guard.
+    
+    :fps: list of filepaths; anything that isn't a TIFF is ignored
+    :tiff_dir: directory to save decoded files to
+    :norm: value for normalizing images; must match the dataset for
+        the decoded files to be used
+    :num_channels: channel depth to truncate images to (-1 to keep all);
+        must match the dataset for the decoded files to be used
+    :processes: number of processes to use for decoding
+    
+    Returns the number of files saved
+    """
+    fps = np.asarray(fps)
+    tiffs = fps[_generate_imtypes(fps) == 3]
+    os.makedirs(tiff_dir, exist_ok=True)
+    
+    load = functools.partial(_tiff_to_float16, norm=norm, 
+                             num_channels=num_channels)
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        for f, img_arr in zip(tiffs, pool.imap(load, tiffs)):
+            tf.io.write_file(_prebaked_path(f, tiff_dir, norm, num_channels), 
+                             tf.io.serialize_tensor(img_arr))
+    return len(tiffs)
+
+
 def _image_file_dataset(fps, imshape=(256,256), 
-                 num_parallel_calls=None, norm=255,
+                 num_parallel_calls=tf.data.experimental.AUTOTUNE, norm=255,
                  num_channels=3, shuffle=False,
-                 single_channel=False):
+                 single_channel=False, indices=None, tiff_dir=None,
+                 post_fns=None, cache=False):
     """
     Basic tool to load images into a tf.data.Dataset using
     PIL.Image or gdal instead of the tensorflow decode functions
@@ -67,16 +129,41 @@ def _image_file_dataset(fps, imshape=(256,256),
     :shuffle: whether to shuffle the dataset
     :single_channel: if True, expect a single-channel input image and 
         stack it num_channels times.
+    :indices: optional array of indices into fps; if passed, load fps[i] for
+        each i in indices instead of each file once. Use this instead of
+        indexing fps to avoid duplicating filepath strings in memory.
+    :tiff_dir: optional directory of TIFF files decoded with prebake_tiffs().
+        any TIFF with a decoded version there will be loaded from it.
+    :post_fns: list of functions (e.g. augmentation) to apply to each image
+        after loading, as part of the same map function
+    :cache: if True, cache decoded images in memory. post_fns are then 
+        applied after the cache instead of during loading.
     
     Returns images as a 3D float32 tensor
     """
+    if post_fns is None:
+        post_fns = []
+    # if we're caching, post_fns have to run after the cache; otherwise
+    # run them in the same map function as loading
+    load_fns = [] if cache else post_fns
     # get an integer index for each filepath
     imtypes = _generate_imtypes(fps)
-    ds = tf.data.Dataset.from_tensor_slices((fps, imtypes))
-    # do the shuffling before loading so we can have a big queue without
-    # taking up much memory
-    if shuffle:
-        ds = ds.shuffle(len(fps))
+    fps = np.asarray(fps)
+    # swap in pre-decoded TIFFs wherever we have them
+    if tiff_dir is not None:
+        fps = fps.astype(object)
+        for i in np.flatnonzero(imtypes == 3):
+            baked = _prebaked_path(fps[i], tiff_dir, norm, num_channels)
+            if os.path.exists(baked):
+                fps[i] = baked
+                imtypes[i] = 4
+    fps = tf.constant(fps)
+    if indices is None:
+        indices = np.arange(len(imtypes))
+    else:
+        indices = np.asarray(indices)
+    # file type of each element of the dataset
+    imtypes = imtypes[indices]
     
     # helper function for resizing images
     def _resize(img):
@@ -86,43 +173,89 @@ def _image_file_dataset(fps, imshape=(256,256),
         return _resize(tiff_to_array(f.numpy().decode("utf-8") , swapaxes=True, 
                                  norm=norm, num_channels=num_channels))
     load_tif = lambda x: tf.py_function(_load_tif, [x], tf.float32)
+    # helper function for loading tiffs decoded by prebake_tiffs()
+    def _load_prebaked(x):
+        decoded = tf.io.parse_tensor(tf.io.read_file(x), tf.float16)
+        decoded.set_shape([None, None, None])
+        return _resize(tf.cast(decoded, tf.float32))
+    
+    # one loader per file type, so that each branch of the pipeline
+    # can be traced without a conditional on the file type
+    def _decoder(decode):
+        return lambda x: _resize(decode(tf.io.read_file(x)))
+    loaders = {0:_decoder(tf.io.decode_png),
+               1:_decoder(tf.io.decode_jpeg),
+               2:_decoder(tf.io.decode_gif),
+               3:load_tif,
+               4:_load_prebaked}
     
     # main loading map function
-    @tf.function
-    def _load_img(x, t):
-        #print("tracing")
-        loaded = tf.io.read_file(x)
-        # jpg
-        if t == 1:
-            decoded = tf.io.decode_jpeg(loaded)
-            resized = _resize(decoded)
-        # gif
-        elif t == 2:
-            decoded = tf.io.decode_gif(loaded)
-            resized = _resize(decoded)
-        # tif
-        elif t == 3:
-            resized = load_tif(x)
-        # png
-        else:
-            decoded = tf.io.decode_png(loaded)
-            resized = _resize(decoded)
-            
-        if single_channel:
-            resized = tf.concat(num_channels*[resized], -1)
-        normed = tf.cast(resized[:,:,:num_channels], tf.float32)/norm
-        return tf.reshape(normed, (imshape[0], imshape[1], num_channels))
-
-    ds = ds.map(lambda x,y: _load_img(x,y), num_parallel_calls=num_parallel_calls)
+    def _load_img(load):
+        @tf.function
+        def _load(i):
+            resized = load(tf.gather(fps, i))
+            if single_channel:
+                resized = tf.concat(num_channels*[resized], -1)
+            normed = tf.cast(resized[:,:,:num_channels], tf.float32)/norm
+            normed = tf.reshape(normed, (imshape[0], imshape[1], num_channels))
+            for fn in load_fns:
+                normed = fn(normed)
+            return normed
+        return _load
+    
+    # build a separate dataset of indices for each file type present
+    types, counts = np.unique(imtypes, return_counts=True)
+    datasets = []
+    for t, c in zip(types, counts):
+        type_ds = tf.data.Dataset.from_tensor_slices(indices[imtypes == t])
+        # do the shuffling before loading so we can have a big queue without
+        # taking up much memory
+        if shuffle:
+            type_ds = type_ds.shuffle(int(c))
+        type_ds = type_ds.map(_load_img(loaders[t]), 
+                              num_parallel_calls=num_parallel_calls)
+        datasets.append(type_ds)
+        
+    # then recombine them
+    if len(datasets) == 1:
+        ds = datasets[0]
+    elif shuffle:
+        ds = tf.data.experimental.sample_from_datasets(datasets,
+                                                weights=(counts/counts.sum()).astype(np.float32))
+    else:
+        # interleave the branches so the original file order is preserved
+        choices = np.searchsorted(types, imtypes).astype(np.int64)
+        ds = tf.data.experimental.choose_from_datasets(datasets,
+                                tf.data.Dataset.from_tensor_slices(choices))
+    
+    if cache:
+        ds = ds.cache()
+        for fn in post_fns:
+            ds = ds.map(fn, num_parallel_calls=num_parallel_calls)
     return ds
 
 
 
 
+def _post_fns(imshape, augment=False, sobel=False):
+    """
+    Build the list of functions to apply to each image after loading
+    
+    :imshape: constant shape images are resized to
+    :augment: augmentation parameters (or True for defaults, or False to disable)
+    :sobel: whether to replace the input image with its sobel edges
+    """
+    post_fns = []
+    if augment: post_fns.append(augment_function(imshape, augment))
+    if sobel: post_fns.append(_sobelize)
+    return post_fns
+
+
 def dataset(fps, ys = None, imshape=(256,256), num_channels=3, 
-                 num_parallel_calls=None, norm=255, batch_size=256,
+                 num_parallel_calls=tf.data.experimental.AUTOTUNE, norm=255, batch_size=256,
                  augment=False, shuffle=False,
-                 sobel=False, single_channel=False):
+                 sobel=False, single_channel=False, cache=False,
+                 tiff_dir=None, drop_remainder=False):
     """
     return a tf dataset that iterates over a list of images once
     
@@ -136,6 +269,13 @@ def dataset(fps, ys = None, imshape=(256,256), num_channels=3,
     :sobel: whether to replace the input image with its sobel edges
     :single_channel: if True, expect a single-channel input image and 
         stack it num_channels times.
+    :cache: if True, cache decoded images in memory (before augmentation) so
+        that repeated passes through the dataset skip loading and decoding.
+        this takes roughly N*H*W*C*4 bytes, and if shuffle is True the order
+        from the first pass will be reused.
+    :tiff_dir: optional directory of TIFF files decoded with prebake_tiffs()
+    :drop_remainder: if True, drop the last partial batch so that every
+        batch has the same shape
     
     Returns
     :ds: tf.data.Dataset object to iterate over data. The dataset returns
@@ -143,24 +283,25 @@ def dataset(fps, ys = None, imshape=(256,256), num_channels=3,
         will be ((x, x_unlab), y)
     :num_steps: number of steps (for passing to tf.keras.Model.fit())
     """
-    if augment:
-        _aug = augment_function(imshape, augment)
     ds = _image_file_dataset(fps, imshape=imshape, num_channels=num_channels, 
                       num_parallel_calls=num_parallel_calls, norm=norm,
-                      shuffle=shuffle, single_channel=single_channel)
-    
-    if augment: ds = ds.map(_aug, num_parallel_calls=num_parallel_calls)
-    if sobel: ds = ds.map(_sobelize, num_parallel_calls=num_parallel_calls)
+                      shuffle=shuffle, single_channel=single_channel,
+                      tiff_dir=tiff_dir, 
+                      post_fns=_post_fns(imshape, augment, sobel),
+                      cache=cache)
         
         
     if ys is not None:
         ys = tf.data.Dataset.from_tensor_slices(ys)
         ds = ds.zip((ds, ys))
         
-    ds = ds.batch(batch_size)
-    ds = ds.prefetch(1)
+    ds = ds.batch(batch_size, drop_remainder=drop_remainder)
+    ds = ds.prefetch(tf.data.experimental.AUTOTUNE)
     
-    num_steps = int(np.ceil(len(fps)/batch_size))
+    if drop_remainder:
+        num_steps = int(len(fps)/batch_size)
+    else:
+        num_steps = int(np.ceil(len(fps)/batch_size))
     return ds, num_steps
 
 
@@ -169,8 +310,9 @@ def dataset(fps, ys = None, imshape=(256,256), num_channels=3,
 
 
 def stratified_training_dataset(fps, y, imshape=(256,256), num_channels=3, 
-                 num_parallel_calls=None, batch_size=256, mult=10,
-                    augment=True, norm=255, sobel=False, single_channel=False):
+                 num_parallel_calls=tf.data.experimental.AUTOTUNE, batch_size=256, mult=10,
+                    augment=True, norm=255, sobel=False, single_channel=False,
+                    tiff_dir=None):
     """
     Training dataset for DeepCluster.
     Build a dataset that provides stratified samples over labels
@@ -186,55 +328,46 @@ def stratified_training_dataset(fps, y, imshape=(256,256), num_channels=3,
     :sobel: whether to replace the input image with its sobel edges
     :single_channel: if True, expect a single-channel input image and 
         stack it num_channels times.
+    :tiff_dir: optional directory of TIFF files decoded with prebake_tiffs()
         
     Returns
     :ds: tf.data.Dataset object to iterate over data
     :num_steps: number of steps (for passing to tf.keras.Model.fit())
     """
     # sample indices to use
-    indices = np.arange(len(fps))
     K = y.max()+1
     samples_per_cluster = mult*int(len(fps)/K)
     
-    sampled_indices = []
-    sampled_labels = []
-    # for each cluster
-    for k in range(K):
-        # find indices of samples assigned to it
-        cluster_inds = indices[y == k]
-        # only sample if at least one is assigned. note that
-        # the deepcluster paper takes an extra step here.
-        if len(cluster_inds) > 0:
-            samps = np.random.choice(cluster_inds, size=samples_per_cluster,
-                            replace=True)
-            sampled_indices.append(samps)
-            sampled_labels.append(k*np.ones(len(samps), dtype=np.int64))
-    # concatenate sampled indices for each cluster
-    sampled_indices = np.concatenate(sampled_indices, 0)    
-    sampled_labels = np.concatenate(sampled_labels, 0)
+    # group indices by cluster with a single sort instead of scanning
+    # the labels once per cluster
+    order = np.argsort(y, kind="stable")
+    bounds = np.searchsorted(y[order], np.arange(K+1))
+    cluster_sizes = np.diff(bounds)
+    # only sample if at least one is assigned. note that
+    # the deepcluster paper takes an extra step here.
+    sampled_clusters = np.flatnonzero(cluster_sizes > 0)
+    # draw random offsets into each nonempty cluster's group all at once
+    offsets = np.random.randint(0, cluster_sizes[sampled_clusters][:,None],
+                                size=(len(sampled_clusters), samples_per_cluster))
+    sampled_indices = order[bounds[sampled_clusters][:,None] + offsets].ravel()
+    # every nonempty cluster got the same number of samples
+    sampled_labels = np.repeat(sampled_clusters.astype(np.int64),
+                               samples_per_cluster)
     # and shuffle their order together
-    reorder = np.random.choice(np.arange(len(sampled_indices)),
-                          size=len(sampled_indices), replace=False)
-    sampled_indices = sampled_indices[reorder]
-    sampled_labels = sampled_labels[reorder]
-    fps = np.array(fps)[sampled_indices]
+    reorder = np.random.permutation(len(sampled_indices))
+    sampled_indices = sampled_indices.take(reorder)
+    sampled_labels = sampled_labels.take(reorder)
     
     # NOW CREATE THE DATASET
     im_ds = _image_file_dataset(fps, imshape=imshape, num_channels=num_channels, 
                       num_parallel_calls=num_parallel_calls, norm=norm, 
-                      shuffle=False, single_channel=single_channel)
-
-    if augment:
-        #im_ds = im_ds.map(_augment, num_parallel_calls)
-        _aug = augment_function(imshape, augment)
-        im_ds = im_ds.map(_aug, num_parallel_calls=num_parallel_calls)
+                      shuffle=False, single_channel=single_channel,
+                      indices=sampled_indices, tiff_dir=tiff_dir,
+                      post_fns=_post_fns(imshape, augment, sobel))
     lab_ds = tf.data.Dataset.from_tensor_slices(sampled_labels)
     ds = tf.data.Dataset.zip((im_ds, lab_ds))
-    #ds = ds.batch(batch_size)
-    if sobel:
-        ds = ds.map(lambda x,y: (_sobelize(x),y), num_parallel_calls=num_parallel_calls)
     ds = ds.batch(batch_size)
-    ds = ds.prefetch(1)
+    ds = ds.prefetch(tf.data.experimental.AUTOTUNE)
     
     num_steps = int(np.ceil(len(sampled_indices)/batch_size))
     return ds, num_steps
\ No newline at end of file
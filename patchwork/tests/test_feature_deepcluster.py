@@ -3,6 +3,8 @@ import numpy as np
 import tensorflow as tf
 
 from patchwork.feature._deepcluster import cluster, _build_model, build_deepcluster_training_step
+from patchwork.feature._deepcluster import DeepClusterTrainer
+from patchwork.loaders import _prebaked_path
 
 inpt = tf.keras.layers.Input((None, None, 3))
 conv = tf.keras.layers.Conv2D(2, 1)(inpt)
@@ -56,4 +58,24 @@ def test_deepcluster_training_step():
     y = np.arange(5)
     
     loss = deepcluster_training_step(x, y, model, opt).numpy()
-    assert loss.dtype == np.float32
\ No newline at end of file
+    assert loss.dtype == np.float32
+    
+    
+def test_deepcluster_trainer_uses_tiff_dir(test_tif_path, tmp_path):
+    tiff_dir = str(tmp_path/"baked")
+    tf.io.gfile.makedirs(tiff_dir)
+    # write a fake decoded version of the TIFF so we can tell whether
+    # the trainer's datasets load it instead of the original file
+    tf.io.write_file(_prebaked_path(test_tif_path, tiff_dir, 255, 3),
+                     tf.io.serialize_tensor(np.full((8,8,3), 255, 
+                                                    dtype=np.float16)))
+    trainer = DeepClusterTrainer(str(tmp_path/"logs"), 4*[test_tif_path], 
+                                 fcn=fcn, augment=False, pca_dim=2, k=2, 
+                                 dense=[3], imshape=(16,16), norm=255,
+                                 batch_size=2, tiff_dir=tiff_dir)
+    
+    assert trainer.input_config["tiff_dir"] == tiff_dir
+    for x in trainer._pred_ds:
+        break
+    assert x.shape == (2,16,16,3)
+    assert np.allclose(x.numpy(), 1)
@@ -4,6 +4,7 @@ import panel as pn
 
 from patchwork._labeler import _single_class_radiobuttons, _gen_figs, ButtonPanel
 from patchwork._labeler import _generate_label_summary, pick_indices
+from patchwork._labeler import _top_indices
 from patchwork._prep import prep_label_dataframe
 
 
@@ -68,12 +69,8 @@ def test_pick_indices():
     assert len(pick_indices(df, pred_df, 100, "maxent: foo", "unlabeled")) == 50
     
     
+def test_top_indices():
+    values = np.array([0.1, 0.5, 0.3, 0.9, 0.2])
     
-    
-    
-    
-    
-    
-    
-    
-    
\ No newline at end of file
+    assert (_top_indices(values, 3) == np.array([3, 1, 2])).all()
+    assert len(_top_indices(values, 0)) == 0
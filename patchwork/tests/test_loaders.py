@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
+import os
 import numpy as np
 import tensorflow as tf
 from patchwork.loaders import _image_file_dataset, dataset, stratified_training_dataset
-from patchwork.loaders import _sobelize
+from patchwork.loaders import _sobelize, _generate_imtypes, prebake_tiffs
+from patchwork.loaders import _tiff_to_float16, _prebaked_path
+from patchwork._util import tiff_to_array
 
 
 
@@ -68,7 +71,22 @@ def test_dataset_with_labels(test_png_path):
         break
     
     assert (y == np.arange(5)).all()
+
+    
     
+def test_dataset_with_cache(test_png_path):
+    imfiles = [test_png_path]*10
+    
+    ds, ns = dataset(imfiles, ys=None, imshape=(11,17),
+                     num_channels=3, norm=255,
+                     batch_size=5, augment={}, cache=True)
+    # iterate twice to make sure the cached pass works too
+    for _ in range(2):
+        for x in ds:
+            x = x.numpy()
+    
+    assert ns == 2
+    assert x.shape == (5, 11, 17, 3)    
     
 def test_stratified_training_dataset(test_png_path):
     imfiles = [test_png_path]*10
@@ -112,6 +130,86 @@ def test_image_file_dataset_stripping_alpha_channel(test_rgba_png_path, test_png
         assert x.min() >= 0
         assert x.shape == (31, 23, 3)
 
+
+
+def _load_separately(imfiles, **kwargs):
+    """
+    Load each file with its own dataset, to compare against
+    """
+    return [next(iter(_image_file_dataset([f], **kwargs))).numpy()
+            for f in imfiles]
+
+
+def test_image_file_dataset_mixed_filetypes(test_png_path, test_jpg_path,
+                                            test_rgba_png_path, test_tif_path):
+    imfiles = [test_png_path, test_jpg_path, test_rgba_png_path, test_tif_path]
+    kwargs = {"imshape":(31,23), "norm":255, "num_channels":3}
+    ds = _image_file_dataset(imfiles, shuffle=False, **kwargs)
+    expected = _load_separately(imfiles, **kwargs)
+    # make sure the test images are actually distinguishable
+    for i in range(len(expected)-1):
+        assert not np.allclose(expected[i], expected[i+1])
+    
+    outputs = [x.numpy() for x in ds]
+    assert len(outputs) == len(imfiles)
+    # output order should match input order
+    for x, e in zip(outputs, expected):
+        assert x.shape == (31, 23, 3)
+        assert np.allclose(x, e)
+
+    
+def test_image_file_dataset_with_indices(test_png_path, test_jpg_path):
+    imfiles = [test_png_path, test_jpg_path]
+    indices = np.array([1,0,1,1,0])
+    kwargs = {"imshape":(31,23), "norm":255, "num_channels":3}
+    ds = _image_file_dataset(imfiles, indices=indices, **kwargs)
+    expected = _load_separately(imfiles, **kwargs)
+    assert not np.allclose(expected[0], expected[1])
+    
+    outputs = [x.numpy() for x in ds]
+    assert len(outputs) == len(indices)
+    # element k should be fps[indices[k]]
+    for x, i in zip(outputs, indices):
+        assert x.shape == (31, 23, 3)
+        assert np.allclose(x, expected[i])
+
+    
+def test_tiff_to_float16(test_tif_path):
+    img_arr = tiff_to_array(test_tif_path, swapaxes=True, norm=255,
+                            num_channels=3)
+    baked = _tiff_to_float16(test_tif_path, norm=255, num_channels=3)
+    
+    assert baked.dtype == np.float16
+    assert baked.shape == img_arr.shape
+    assert np.allclose(baked, img_arr, rtol=1e-3, atol=0)
+
+
+def test_image_file_dataset_with_prebaked_tiffs(test_tif_path, tmp_path):
+    tiff_dir = str(tmp_path)
+    # norm=1 so the pixel values are large enough for the comparison
+    # to mean something (and exactly representable in float16)
+    assert prebake_tiffs([test_tif_path], tiff_dir, norm=1, num_channels=3,
+                         processes=1) == 1
+    
+    ds = _image_file_dataset([test_tif_path], imshape=(31,23),
+                             norm=1, num_channels=3)
+    baked_ds = _image_file_dataset([test_tif_path], imshape=(31,23),
+                                   norm=1, num_channels=3,
+                                   tiff_dir=tiff_dir)
+    for x, x_baked in zip(ds, baked_ds):
+        assert x_baked.shape == (31, 23, 3)
+        assert x.numpy().max() > 1
+        assert np.allclose(x.numpy(), x_baked.numpy(), rtol=1e-3, atol=0)
+    
+    
+def test_prebaked_tiffs_not_reused_with_different_settings(test_tif_path,
+                                                           tmp_path):
+    tiff_dir = str(tmp_path)
+    prebake_tiffs([test_tif_path], tiff_dir, norm=1, num_channels=3,
+                  processes=1)
+    
+    assert os.path.exists(_prebaked_path(test_tif_path, tiff_dir, 1, 3))
+    assert not os.path.exists(_prebaked_path(test_tif_path, tiff_dir, 255, 3))
     
     
 def test_dataset_works_with_keras_api(test_png_path):
@@ -138,4 +236,10 @@ def test_dataset_works_with_keras_api(test_png_path):
     assert isinstance(hist, tf.keras.callbacks.History)
     print(hist)
     
-    
\ No newline at end of file
+    
+
+def test_generate_imtypes():
+    fps = ["foo.png", "foo.JPG", "bar.jpeg", "baz.gif", "baz.tif", "baz.TIFF"]
+    imtypes = _generate_imtypes(fps)
+    
+    assert (imtypes == np.array([0, 1, 1, 2, 3, 3])).all()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from patchwork._main import GUI
+
+
+def _build_gui(N=20, d=8):
+    df = pd.DataFrame({
+            "filepath":["%s.jpg"%i for i in range(N)],
+            "exclude":[False]*N,
+            "validation":[False]*N,
+            "class1":[i%2 for i in range(N)],
+            "class2":[(i+1)%2 for i in range(N)]
+            })
+    features = np.random.normal(0, 1, (N,d)).astype(np.float32)
+    gui = GUI(df, feature_vecs=features)
+    gui.fine_tuning_model = tf.keras.Sequential([
+        tf.keras.layers.Dense(len(gui.classes), activation="sigmoid")])
+    gui.build_model()
+    return gui
+
+
+def test_gui_fit():
+    gui = _build_gui()
+    history = gui.fit(batch_size=5, num_samples=20)
+    assert len(history.history["loss"]) == 1
+
+
+def test_gui_fit_fewer_samples_than_batch_size():
+    gui = _build_gui()
+    history = gui.fit(batch_size=32, num_samples=10)
+    assert np.isfinite(history.history["loss"][0])
@@ -3,8 +3,9 @@ import numpy as np
 import pandas as pd
 
 from patchwork._sample import find_unlabeled, find_fully_labeled
-from patchwork._sample import find_partially_labeled
+from patchwork._sample import find_partially_labeled, find_subset
 from patchwork._sample import stratified_sample, unlabeled_sample
+from patchwork._sample import _build_in_memory_dataset
 
 
 testdf = pd.DataFrame({
@@ -43,4 +44,46 @@ def test_stratified_sampler():
     assert ys.shape[0] == N
     assert ys.shape[1] == 2
     #assert isinstance(outlist[0], str)
-    #assert False, "this should definitely be tested"
\ No newline at end of file
+    #assert False, "this should definitely be tested"    
+    
+def test_stratified_sampler_return_indices():
+    N = 100
+    inds, ys = stratified_sample(testdf, N=N, return_indices=True)
+    
+    assert inds.shape == (N,)
+    assert ys.shape == (N,2)
+    # excluded record should never get sampled
+    assert 0 not in inds
+    # missing labels mapped to -1
+    assert (ys[inds == 3] == np.array([1,-1])).all()
+    
+    
+def test_build_in_memory_dataset():
+    features = np.random.normal(0, 1, (5,3,3,7))
+    inds, ys = stratified_sample(testdf, N=10, return_indices=True)
+    ds = _build_in_memory_dataset(features, inds, ys, batch_size=5)
+    
+    for x, y in ds:
+        break
+    assert x.shape == (5,3,3,7)
+    assert y.shape == (5,2)
+    assert np.allclose(x.numpy()[0], features[inds[0]])
+    
+    
+def test_find_subset():
+    assert find_subset(testdf, "unlabeled").sum() == 1
+    assert find_subset(testdf, "excluded").sum() == 1
+    assert find_subset(testdf, "unlabeled: class2").sum() == 3
+    assert find_subset(testdf, "contains: class1").sum() == 3
+    assert find_subset(testdf, "doesn't contain: class1").sum() == 1
+    assert find_subset(testdf, "doesn't contain: class2").sum() == 1
+    
+    
+def test_build_in_memory_dataset_drop_remainder():
+    features = np.random.normal(0, 1, (5,3,3,7))
+    inds, ys = stratified_sample(testdf, N=12, return_indices=True)
+    ds = _build_in_memory_dataset(features, inds, ys, batch_size=5,
+                                  drop_remainder=True)
+    
+    batch_sizes = [x.shape[0] for x, y in ds]
+    assert batch_sizes == [5, 5]